@@ -0,0 +1,208 @@
+import { StepConfig } from '@motiadev/core'
+import { SupabaseClient } from '@supabase/supabase-js'
+import axios from 'axios'
+import { getOptionalEnv, getRequiredEnv } from './utils/env'
+import { initSupabaseClient } from './utils/supabase'
+
+const OPENAI_API_URL = 'https://api.openai.com/v1'
+// Emails submitted by the Generate Email Variations step, one row per email
+const VARIATION_BATCHES_TABLE = 'variation_batches'
+const VARIATIONS_CACHE_TABLE = 'variations_cache'
+const VARIATIONS_PER_EMAIL = 3
+const TERMINAL_BATCH_STATUSES = ['completed', 'failed', 'expired', 'cancelled']
+
+export const config: StepConfig = {
+  type: 'cron',
+  name: 'Collect Variation Batches',
+  description:
+    'Stores email variations from finished OpenAI batches, running every 5 minutes',
+  cron: '*/5 * * * *', // Every 5 minutes
+  flows: ['job-search'],
+  emits: ['email.variations.generated'],
+}
+
+interface BatchRequest {
+  email_id: string
+  batch_id: string
+  lead_id: string
+  cache_keys: string[]
+}
+
+/**
+ * Parses a batch output file into the variations of each email, skipping failed
+ * requests and replies that were cut off at the token cap
+ */
+function parseBatchOutput(output: string, ctx: any): Map<string, string[]> {
+  const variations = new Map<string, string[]>()
+
+  for (const line of output.split('\n')) {
+    if (!line.trim()) continue
+
+    const result = JSON.parse(line)
+    const response = result.response || {}
+    if (response.status_code !== 200) {
+      ctx.logger.warn(
+        `Variation request ${result.custom_id} failed: ${JSON.stringify(result.error)}`
+      )
+      continue
+    }
+
+    const choices = response.body.choices
+    if (choices.some((choice: any) => choice.finish_reason === 'length')) {
+      ctx.logger.warn(
+        `Variation request ${result.custom_id} was cut off at the token cap`
+      )
+      continue
+    }
+
+    if (choices.length === VARIATIONS_PER_EMAIL) {
+      variations.set(
+        result.custom_id,
+        choices.map((choice: any) => choice.message.content)
+      )
+    }
+  }
+
+  return variations
+}
+
+/**
+ * Stores the variations of one email if it is still scheduled, and caches them
+ * @returns True if the email was updated
+ */
+async function storeVariations(
+  supabase: SupabaseClient,
+  request: BatchRequest,
+  bodies: string[],
+  ctx: any
+): Promise<boolean> {
+  // Only the variation columns are written, guarded on the status, so an email
+  // that was sent or edited while the batch ran is left alone
+  const { data, error } = await supabase
+    .from('emails')
+    .update({ body_2: bodies[0], body_3: bodies[1], body_4: bodies[2] })
+    .eq('id', request.email_id)
+    .eq('status', 'Scheduled')
+    .select('id')
+
+  if (error) {
+    ctx.logger.error(
+      `Error updating email ${request.email_id} with variations: ${error.message}`
+    )
+    return false
+  }
+
+  const createdAt = new Date().toISOString()
+  const { error: cacheError } = await supabase.from(VARIATIONS_CACHE_TABLE).upsert(
+    request.cache_keys.map((key, index) => ({
+      key,
+      body: bodies[index],
+      created_at: createdAt,
+    })),
+    { onConflict: 'key' }
+  )
+  if (cacheError) {
+    ctx.logger.warn(`Variation cache write failed: ${cacheError.message}`)
+  }
+
+  if (!data || data.length === 0) {
+    ctx.logger.info(
+      `Email ${request.email_id} is no longer scheduled. Skipping variations.`
+    )
+    return false
+  }
+
+  return true
+}
+
+export async function handler(ctx: any) {
+  // Batches are only submitted in batch mode, and the tracking table may not exist otherwise
+  const useBatchApi = ['1', 'true', 'yes'].includes(
+    getOptionalEnv('VARIATIONS_USE_BATCH_API', 'false').toLowerCase()
+  )
+  if (!useBatchApi) {
+    return { storedCount: 0, reason: 'batch_api_disabled' }
+  }
+
+  const openaiApiKey = getRequiredEnv('OPENAI_API_KEY', ctx.logger)
+  const supabase = initSupabaseClient(ctx.logger)
+  const headers = { Authorization: `Bearer ${openaiApiKey}` }
+
+  const { data: requests, error: fetchError } = await supabase
+    .from(VARIATION_BATCHES_TABLE)
+    .select('email_id,batch_id,lead_id,cache_keys')
+
+  if (fetchError) {
+    ctx.logger.error(`Error fetching variation batches: ${fetchError.message}`)
+    throw new Error(`Failed to fetch variation batches: ${fetchError.message}`)
+  }
+
+  // Group the submitted emails by batch
+  const batches = new Map<string, BatchRequest[]>()
+  for (const request of (requests || []) as BatchRequest[]) {
+    const batchRequests = batches.get(request.batch_id) || []
+    batchRequests.push(request)
+    batches.set(request.batch_id, batchRequests)
+  }
+
+  let storedCount = 0
+
+  for (const [batchId, batchRequests] of batches) {
+    try {
+      const { data: batch } = await axios.get(
+        `${OPENAI_API_URL}/batches/${batchId}`,
+        { headers }
+      )
+
+      if (!TERMINAL_BATCH_STATUSES.includes(batch.status)) {
+        ctx.logger.info(`Variation batch ${batchId} is ${batch.status}`)
+        continue
+      }
+
+      if (batch.status === 'completed' && batch.output_file_id) {
+        const { data: output } = await axios.get(
+          `${OPENAI_API_URL}/files/${batch.output_file_id}/content`,
+          { headers, responseType: 'text' }
+        )
+        const variations = parseBatchOutput(output, ctx)
+
+        for (const request of batchRequests) {
+          const bodies = variations.get(request.email_id)
+          if (!bodies) {
+            ctx.logger.error(`No variations returned for email ${request.email_id}`)
+            continue
+          }
+
+          if (await storeVariations(supabase, request, bodies, ctx)) {
+            storedCount++
+            await ctx.emit({
+              topic: 'email.variations.generated',
+              data: { emailId: request.email_id, leadId: request.lead_id },
+            })
+          }
+        }
+      } else {
+        ctx.logger.warn(`Variation batch ${batchId} ended with status ${batch.status}`)
+      }
+
+      // Release the emails; any left without variations are resubmitted by the next scan
+      const { error: deleteError } = await supabase
+        .from(VARIATION_BATCHES_TABLE)
+        .delete()
+        .eq('batch_id', batchId)
+
+      if (deleteError) {
+        ctx.logger.error(
+          `Error releasing variation batch ${batchId}: ${deleteError.message}`
+        )
+      }
+    } catch (error) {
+      const errorMessage = error instanceof Error ? error.message : String(error)
+      ctx.logger.error(`Error collecting variation batch ${batchId}: ${errorMessage}`)
+    }
+  }
+
+  ctx.logger.info(`Stored variations for ${storedCount} emails from finished batches`)
+
+  return { storedCount }
+}
@@ -1,17 +1,75 @@
-import marvin
 import os
 import supabase
 import json
 import asyncio
-from typing import Optional, Dict, Any
+import atexit
+import datetime
+import hashlib
+import logging
+import re
+import httpx
+from aiolimiter import AsyncLimiter
+from openai import APITimeoutError, AsyncOpenAI, RateLimitError
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_random_exponential
+from typing import Optional, List
+
+logger = logging.getLogger(__name__)
 
 SUPABASE_URL = os.environ.get("SUPABASE_URL")
 SUPABASE_ANON_KEY = os.environ.get("SUPABASE_ANON_KEY")
-# Set the default model for Marvin functions globally
-marvin.defaults.model = "openai:o4-mini-2025-04-16"
-
-async def generate_variation(job_description: str, current_message: str) -> str:
-   instructions =  """
+# Connection pool limits for the shared HTTP clients below
+HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20)
+
+# Shared HTTP client for Supabase, kept alive across events
+_supabase_http = httpx.Client(limits=HTTP_LIMITS, timeout=20.0)
+atexit.register(_supabase_http.close)
+
+# Shared Supabase client, created once so its HTTP connections are reused across events
+SUPABASE_CLIENT = (
+    supabase.create_client(
+        SUPABASE_URL,
+        SUPABASE_ANON_KEY,
+        options=supabase.ClientOptions(postgrest_client_timeout=20, httpx_client=_supabase_http),
+    )
+    if SUPABASE_URL and SUPABASE_ANON_KEY
+    else None
+)
+# Model used for email variations. Rewriting a short outreach draft does not need a
+# reasoning model; MODEL_OVERRIDE allows escalating to a larger one.
+VARIATION_MODEL = os.environ.get("MODEL_OVERRIDE") or "gpt-4o-mini"
+VARIATION_TEMPERATURE = 0.9
+# OpenAI reasoning models reject temperature, max_tokens and stop, and spend part of
+# max_completion_tokens on hidden reasoning, so they get a larger completion budget
+REASONING_MODEL_RE = re.compile(r"^(o\d|gpt-5(?!-chat))")
+REASONING_MAX_COMPLETION_TOKENS = 4000
+# Maximum number of emails whose variations are generated at the same time
+MAX_CONCURRENT_EMAILS = 5
+# Number of scheduled emails fetched and processed per page
+EMAIL_PAGE_SIZE = 100
+# Submit variations as OpenAI Batch API jobs (half price, completes asynchronously).
+# Submitted emails are tracked in VARIATION_BATCHES_TABLE until the Collect Variation
+# Batches cron step stores their results
+USE_BATCH_API = os.environ.get("VARIATIONS_USE_BATCH_API", "").lower() in ("1", "true", "yes")
+# Number of variations generated for every email (stored as body_2, body_3, body_4)
+VARIATIONS_PER_EMAIL = 3
+# Supabase table caching generated variations by prompt hash, and how long entries stay valid
+VARIATIONS_CACHE_TABLE = "variations_cache"
+VARIATIONS_CACHE_TTL = datetime.timedelta(days=30)
+VARIATION_BATCHES_TABLE = "variation_batches"
+# Request budget for the variation LLM calls, and per-attempt timeout in seconds
+VARIATIONS_RPM = int(os.environ.get("VARIATIONS_RPM", "60"))
+VARIATION_TIMEOUT = 20
+VARIATION_MAX_ATTEMPTS = 3
+# Output cap for a variation: a 150-word body at ~1.4 tokens per word, plus headroom
+# for the greeting and sign-off. Replies cut off at the cap are rejected, not stored
+VARIATION_MAX_TOKENS = 300
+VARIATION_STOP_SEQUENCES = ["\n\n\n"]
+
+
+class TruncatedVariationError(Exception):
+    """Raised when a variation hit the output token cap before finishing"""
+
+VARIATION_INSTRUCTIONS = """
     You are helping improve a cold outreach message for a Founding Engineer or similar early technical role.
 
     Inputs:
@@ -39,31 +97,239 @@ async def generate_variation(job_description: str, current_message: str) -> str:
     Assume the reader is busy.
     Focus on clarity, authenticity, and impact.
     If something feels obvious or filler, cut it.
+    Keep the whole message under 150 words.
+    """
+
+def _variation_messages(job_description: str, current_message: str):
+    # Keep the static instructions first and byte-identical, followed by the job description,
+    # so provider prompt caching can reuse the prefix across calls for the same lead.
+    return [
+        {"role": "system", "content": VARIATION_INSTRUCTIONS},
+        {
+            "role": "user",
+            "content": f"job_description:\n{job_description}\n\ncurrent_message:\n{current_message}",
+        },
+    ]
+
+
+class VariationSession:
     """
+    OpenAI client, rate limiter and in-flight variation requests for one variation scan.
+
+    Pooled connections, the limiter and futures are bound to the event loop they were
+    created on, so every scan opens its own session and closes it when done.
+    """
+
+    def __init__(self):
+        # Retries are handled by tenacity around each call. The HTTP/2 client multiplexes the
+        # concurrent variation requests over a few kept-alive connections.
+        http_client = httpx.AsyncClient(http2=True, limits=HTTP_LIMITS, timeout=VARIATION_TIMEOUT)
+        self.openai = AsyncOpenAI(http_client=http_client, max_retries=0)
+        self.limiter = AsyncLimiter(VARIATIONS_RPM, 60)
+        self.in_flight = {}
+
+    async def __aenter__(self):
+        return self
 
-   task = marvin.Task(
-      instructions=instructions,
-      context={
-         "current_message": current_message,
-         "job_description": job_description
-      }
-   )
-   response = task.run()
-   print(response)
-   return response
-
-
-def init_supabase_client(ctx):
-    if not SUPABASE_URL or not SUPABASE_ANON_KEY:
-        ctx.logger.error("Supabase URL or Service Role Key not configured.")
-        raise ValueError("Missing Supabase configuration.")
+    async def __aexit__(self, *exc_info):
+        await self.openai.close()
+
+
+def _prompt_key(job_description: str, current_message: str) -> str:
+    return hashlib.sha256(
+        f"{PROMPT_VERSION}|{current_message}|{job_description}".encode("utf-8")
+    ).hexdigest()
+
+
+def _variation_key(job_description: str, current_message: str, seed: int) -> str:
+    return hashlib.sha256(
+        f"{PROMPT_VERSION}|{current_message}|{job_description}|{seed}".encode("utf-8")
+    ).hexdigest()
+
+
+def _variation_keys(job_description: str, current_message: str) -> List[str]:
+    return [
+        _variation_key(job_description, current_message, seed)
+        for seed in range(1, VARIATIONS_PER_EMAIL + 1)
+    ]
+
+
+async def _get_cached_variations(cache_client, keys: List[str]) -> Optional[List[str]]:
+    cutoff = (datetime.datetime.now(datetime.timezone.utc) - VARIATIONS_CACHE_TTL).isoformat()
     try:
-        client = supabase.create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
-        ctx.logger.info("Supabase client initialized successfully.")
-        return client
+        response = await asyncio.to_thread(
+            lambda: cache_client.table(VARIATIONS_CACHE_TABLE).select("key,body")
+            .in_("key", keys).gte("created_at", cutoff).execute()
+        )
     except Exception as e:
-        ctx.logger.error(f"Failed to initialize Supabase client: {e}")
+        logger.warning("Variation cache lookup failed: %s", e)
+        return None
+    bodies = {row["key"]: row["body"] for row in response.data or []}
+    if not all(key in bodies for key in keys):
+        return None
+    return [bodies[key] for key in keys]
+
+
+async def _set_cached_variations(cache_client, keys: List[str], bodies: List[str]) -> None:
+    created_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    rows = [
+        {"key": key, "body": body, "created_at": created_at}
+        for key, body in zip(keys, bodies)
+    ]
+    try:
+        await asyncio.to_thread(
+            lambda: cache_client.table(VARIATIONS_CACHE_TABLE).upsert(rows, on_conflict="key").execute()
+        )
+    except Exception as e:
+        logger.warning("Variation cache write failed: %s", e)
+
+
+def _completion_params() -> dict:
+    """Sampling and length parameters supported by VARIATION_MODEL"""
+    if REASONING_MODEL_RE.match(VARIATION_MODEL):
+        return {"max_completion_tokens": REASONING_MAX_COMPLETION_TOKENS}
+    return {
+        "temperature": VARIATION_TEMPERATURE,
+        "max_tokens": VARIATION_MAX_TOKENS,
+        "stop": VARIATION_STOP_SEQUENCES,
+    }
+
+
+def _prompt_version() -> str:
+    """Hash of everything besides the inputs that shapes the generated variations"""
+    params = json.dumps(_completion_params(), sort_keys=True)
+    return hashlib.sha256(f"{VARIATION_MODEL}|{VARIATION_INSTRUCTIONS}|{params}".encode("utf-8")).hexdigest()
+
+
+# Part of every cache key, so changing the model, instructions or parameters starts a fresh cache
+PROMPT_VERSION = _prompt_version()
+
+
+@retry(
+    wait=wait_random_exponential(min=1, max=30),
+    stop=stop_after_attempt(VARIATION_MAX_ATTEMPTS),
+    retry=retry_if_exception_type((RateLimitError, APITimeoutError, TruncatedVariationError)),
+    reraise=True,
+)
+async def _call_variation_llm(session: VariationSession, job_description: str, current_message: str) -> List[str]:
+    async with session.limiter:
+        completion = await session.openai.chat.completions.create(
+            model=VARIATION_MODEL,
+            messages=_variation_messages(job_description, current_message),
+            n=VARIATIONS_PER_EMAIL,
+            **_completion_params(),
+        )
+    if any(choice.finish_reason == "length" for choice in completion.choices):
+        raise TruncatedVariationError("Variation hit the output token cap")
+    return [choice.message.content for choice in completion.choices]
+
+
+async def _run_variations(
+    session: VariationSession, job_description: str, current_message: str, cache_client=None
+) -> List[str]:
+    keys = _variation_keys(job_description, current_message)
+    if cache_client is not None:
+        cached = await _get_cached_variations(cache_client, keys)
+        if cached is not None:
+            return cached
+
+    bodies = await _call_variation_llm(session, job_description, current_message)
+    if cache_client is not None:
+        await _set_cached_variations(cache_client, keys, bodies)
+    return bodies
+
+
+async def generate_variations(
+    session: VariationSession, job_description: str, current_message: str, cache_client=None
+) -> List[str]:
+    """
+    Generate VARIATIONS_PER_EMAIL variations of current_message with a single LLM request.
+    Concurrent calls with the same inputs in one session share that request.
+    When cache_client (a Supabase client) is given, results are cached in VARIATIONS_CACHE_TABLE.
+    """
+    key = _prompt_key(job_description, current_message)
+    in_flight = session.in_flight
+    future = in_flight.get(key)
+    if future is None:
+        future = asyncio.ensure_future(_run_variations(session, job_description, current_message, cache_client))
+        in_flight[key] = future
+        future.add_done_callback(lambda _: in_flight.pop(key, None))
+    return await asyncio.shield(future)
+
+
+async def get_emails_in_batches(supabase_client, email_ids) -> set:
+    """Return the IDs among email_ids that are waiting on a submitted variation batch"""
+    response = await asyncio.to_thread(
+        lambda: supabase_client.table(VARIATION_BATCHES_TABLE).select("email_id")
+        .in_("email_id", [str(email_id) for email_id in email_ids]).execute()
+    )
+    return {row["email_id"] for row in response.data or []}
+
+
+async def submit_variation_batch(session: VariationSession, jobs, supabase_client, ctx) -> str:
+    """
+    Submit variations for many emails as a single OpenAI Batch API job, without waiting for it.
+
+    Every email is recorded in VARIATION_BATCHES_TABLE with its cache keys, so the
+    Collect Variation Batches cron step can store the results once the batch finishes.
+
+    Args:
+        session: Variation session whose OpenAI client submits the batch
+        jobs: List of (email, job_description) tuples for emails without cached variations
+        supabase_client: Supabase client used to record the submitted batch
+        ctx: Context object provided by Motia, used for logging
+
+    Returns:
+        ID of the submitted batch
+    """
+    client = session.openai
+
+    lines = []
+    for email, job_description in jobs:
+        lines.append(json.dumps({
+            "custom_id": str(email["id"]),
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": VARIATION_MODEL,
+                "messages": _variation_messages(job_description, email["body_1"]),
+                "n": VARIATIONS_PER_EMAIL,
+                **_completion_params(),
+            },
+        }))
+
+    batch_file = await client.files.create(
+        file=("email-variations.jsonl", "\n".join(lines).encode("utf-8")),
+        purpose="batch",
+    )
+    batch = await client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+    )
+
+    rows = [
+        {
+            "email_id": str(email["id"]),
+            "batch_id": batch.id,
+            "lead_id": email["lead_id"],
+            "cache_keys": _variation_keys(job_description, email["body_1"]),
+        }
+        for email, job_description in jobs
+    ]
+    try:
+        await asyncio.to_thread(
+            lambda: supabase_client.table(VARIATION_BATCHES_TABLE).insert(rows).execute()
+        )
+    except Exception:
+        # Untracked results would never be collected, and the next scan would submit
+        # and pay for the same emails again
+        ctx.logger.error(f"Failed to record variation batch {batch.id}. Cancelling it.")
+        await client.batches.cancel(batch.id)
         raise
+    ctx.logger.info(f"Submitted variation batch {batch.id} with {len(lines)} requests")
+    return batch.id
+
 
 config = {
     "type": "event",
@@ -74,73 +340,195 @@ config = {
     "flows": ["job-search"],
 }
 
-async def handler(event, ctx):
-    ctx.logger.info("Starting email variation generation")
+async def store_variations(supabase_client, email_id, bodies: List[str]) -> bool:
+    """
+    Write the variations to body_2..body_4 of an email that is still Scheduled.
 
-    try:
-        supabase_client = init_supabase_client(ctx)
+    Only the variation columns are written, so a row that was sent, edited or deleted
+    since it was read is left alone.
 
-        # Query for leads with emails that need variations
-        email_response = supabase_client.table("emails").select(
-            "id,body_1,lead_id"
-        ).eq("status", "Scheduled").execute()
+    Returns:
+        Whether the email was updated
+    """
+    response = await asyncio.to_thread(
+        lambda: supabase_client.table("emails").update({
+            "body_2": bodies[0],
+            "body_3": bodies[1],
+            "body_4": bodies[2],
+        }).eq("id", email_id).eq("status", "Scheduled").execute()
+    )
+    return bool(response.data)
 
-        if not email_response.data or len(email_response.data) == 0:
-            ctx.logger.info("No scheduled emails found that need variations.")
-            return {"success": True, "count": 0}
 
-        ctx.logger.info(f"Found {len(email_response.data)} scheduled emails to generate variations for")
+async def process_email_page(emails, supabase_client, session: VariationSession, ctx) -> int:
+    """
+    Generate variations for one page of scheduled emails and store them.
 
-        processed_count = 0
-        for email in email_response.data:
-            email_id = email.get("id")
-            lead_id = email.get("lead_id")
-            current_message = email.get("body_1")
-
-            if not email_id or not lead_id or not current_message:
-                ctx.logger.warn(f"Missing required data for email {email_id}. Skipping.")
-                continue
-
-            ctx.logger.info(f"Processing variations for email ID: {email_id}, lead ID: {lead_id}")
-
-            # Fetch the lead's job description
-            lead_response = supabase_client.table("leads").select("job_description").eq("id", lead_id).maybe_single().execute()
-
-            if not lead_response.data:
-                ctx.logger.warn(f"Lead record not found for ID: {lead_id}. Skipping.")
-                continue
-
-            job_description = lead_response.data.get("job_description")
-            if not job_description:
-                ctx.logger.info(f"Job description is empty for lead ID: {lead_id}. Using minimal personalization.")
-                job_description = "No job description provided."
-
-            # Generate 3 variations
-            ctx.logger.info(f"Generating 3 variations for email {email_id}")
-            body2 = await generate_variation(job_description=job_description, current_message=current_message)
-            body3 = await generate_variation(job_description=job_description, current_message=current_message)
-            body4 = await generate_variation(job_description=job_description, current_message=current_message)
-
-            # Update the email record with variations
-            update_data = {
-                "body_2": body2,
-                "body_3": body3,
-                "body_4": body4,
+    Args:
+        emails: Email rows (id, body_1, lead_id) from the emails table
+        supabase_client: Supabase client used for leads, emails and the variation cache
+        session: Variation session used for the LLM requests
+        ctx: Context object provided by Motia
+
+    Returns:
+        Number of emails updated with variations
+    """
+    # Fetch the job descriptions for all leads in a single query
+    lead_ids = list({email["lead_id"] for email in emails if email.get("lead_id")})
+    job_descriptions = {}
+    if lead_ids:
+        leads_response = await asyncio.to_thread(
+            lambda: supabase_client.table("leads").select(
+                "id,job_description"
+            ).in_("id", lead_ids).execute()
+        )
+        job_descriptions = {
+            lead["id"]: lead.get("job_description") for lead in leads_response.data or []
+        }
+
+    # Collect the emails that have everything needed to generate variations
+    pending = []
+    for email in emails:
+        email_id = email.get("id")
+        lead_id = email.get("lead_id")
+        current_message = email.get("body_1")
+
+        if not email_id or not lead_id or not current_message:
+            ctx.logger.warn(f"Missing required data for email {email_id}. Skipping.")
+            continue
+
+        if lead_id not in job_descriptions:
+            ctx.logger.warn(f"Lead record not found for ID: {lead_id}. Skipping.")
+            continue
+
+        job_description = job_descriptions[lead_id]
+        if not job_description:
+            ctx.logger.info(f"Job description is empty for lead ID: {lead_id}. Using minimal personalization.")
+            job_description = "No job description provided."
+
+        pending.append((email, job_description))
+
+    updates = []
+    if USE_BATCH_API and pending:
+        in_batches = await get_emails_in_batches(supabase_client, [email["id"] for email, _ in pending])
+        pending = [(email, jd) for email, jd in pending if str(email["id"]) not in in_batches]
+        if in_batches:
+            ctx.logger.info(f"Skipping {len(in_batches)} emails already waiting on a variation batch")
+
+        cached = await asyncio.gather(*(
+            _get_cached_variations(supabase_client, _variation_keys(job_description, email["body_1"]))
+            for email, job_description in pending
+        ))
+        misses = []
+        for (email, job_description), bodies in zip(pending, cached):
+            if bodies is None:
+                misses.append((email, job_description))
+            else:
+                updates.append((email, bodies))
+
+        if misses:
+            ctx.logger.info(f"Generating variations for {len(misses)} emails with the Batch API")
+            await submit_variation_batch(session, misses, supabase_client, ctx)
+    else:
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_EMAILS)
+
+        async def process_email(email, job_description):
+            async with semaphore:
+                ctx.logger.info(f"Generating 3 variations for email {email['id']}")
+                bodies = await generate_variations(
+                    session,
+                    job_description=job_description,
+                    current_message=email["body_1"],
+                    cache_client=supabase_client,
+                )
+                ctx.logger.info(f"Generated variations for email {email['id']}")
+                return email, bodies
+
+        results = await asyncio.gather(
+            *(process_email(email, job_description) for email, job_description in pending),
+            return_exceptions=True,
+        )
+
+        for (email, _), result in zip(pending, results):
+            if isinstance(result, Exception):
+                ctx.logger.error(f"Error generating variations for email {email['id']}: {result}")
+            else:
+                updates.append(result)
+
+    if not updates:
+        return 0
+
+    # Update the email records with their variations concurrently
+    results = await asyncio.gather(
+        *(store_variations(supabase_client, email["id"], bodies) for email, bodies in updates),
+        return_exceptions=True,
+    )
+    stored = []
+    for (email, _), result in zip(updates, results):
+        if isinstance(result, Exception):
+            ctx.logger.error(f"Error updating email {email['id']} with variations: {result}")
+        elif not result:
+            ctx.logger.info(f"Email {email['id']} is no longer scheduled. Skipping variations.")
+        else:
+            stored.append(email)
+    ctx.logger.info(f"Successfully updated {len(stored)} emails with variations")
+
+    # Emit event for each processed email
+    await asyncio.gather(*(
+        ctx.emit({
+            "topic": "email.variations.generated",
+            "data": {
+                "emailId": email["id"],
+                "leadId": email["lead_id"]
             }
+        })
+        for email in stored
+    ))
+
+    return len(stored)
 
-            update_response = supabase_client.table("emails").update(update_data).eq("id", email_id).execute()
 
-            ctx.logger.info(f"Successfully updated email {email_id} with variations")
-            processed_count += 1
+async def generate_all_variations(ctx):
+    ctx.logger.info("Starting email variation generation")
 
-            # Emit event for each processed email
-            await ctx.emit({
-                "topic": "email.variations.generated",
-                "data": {
-                    "emailId": email_id,
-                    "leadId": lead_id
-                }
-            })
+    try:
+        if SUPABASE_CLIENT is None:
+            ctx.logger.error("Supabase URL or Service Role Key not configured.")
+            raise ValueError("Missing Supabase configuration.")
+        supabase_client = SUPABASE_CLIENT
+
+        processed_count = 0
+        found_count = 0
+        last_id = None
+        async with VariationSession() as session:
+            while True:
+                # Query for leads with emails that need variations, one page at a time. Pages are
+                # keyed on the last seen id because emails leave Scheduled while the scan runs
+                query = supabase_client.table("emails").select(
+                    "id,body_1,lead_id"
+                ).eq("status", "Scheduled")
+                if last_id is not None:
+                    query = query.gt("id", last_id)
+                email_response = await asyncio.to_thread(
+                    lambda: query.order("id").limit(EMAIL_PAGE_SIZE).execute()
+                )
+
+                if not email_response.data:
+                    break
+
+                found_count += len(email_response.data)
+                ctx.logger.info(f"Found {len(email_response.data)} scheduled emails to generate variations for")
+                processed_count += await process_email_page(
+                    email_response.data, supabase_client, session, ctx
+                )
+
+                if len(email_response.data) < EMAIL_PAGE_SIZE:
+                    break
+                last_id = email_response.data[-1]["id"]
+
+        if found_count == 0:
+            ctx.logger.info("No scheduled emails found that need variations.")
+            return {"success": True, "count": 0}
 
         ctx.logger.info(f"Completed generating variations for {processed_count} emails")
         return {"success": True, "count": processed_count}
@@ -149,6 +537,52 @@ async def handler(event, ctx):
         ctx.logger.error(f"Error in generate variations handler: {e}")
         return {"success": False, "error": str(e)}
 
+class _ScanState:
+    """Variation scans of one event loop"""
+
+    def __init__(self):
+        self.task = None
+        # Result of the scan waiting to start, shared by every event that arrived since the
+        # running scan began, and the context of the latest of them
+        self.next_scan = None
+        self.next_ctx = None
+
+
+# Every event triggers the same scan of all Scheduled emails, so events are coalesced:
+# at most one scan runs per event loop, and events arriving during it share exactly one
+# follow-up scan, which picks up their emails. Entries only exist while scans are running
+_scan_states = {}
+
+
+async def _run_scans(loop, state):
+    scan = None
+    try:
+        while state.next_scan is not None:
+            scan, ctx = state.next_scan, state.next_ctx
+            state.next_scan = state.next_ctx = None
+            scan.set_result(await generate_all_variations(ctx))
+    finally:
+        for future in (scan, state.next_scan):
+            if future is not None and not future.done():
+                future.cancel()
+        state.task = None
+        del _scan_states[loop]
+
+
+async def handler(event, ctx):
+    loop = asyncio.get_running_loop()
+    state = _scan_states.get(loop)
+    if state is None:
+        state = _scan_states[loop] = _ScanState()
+        state.task = loop.create_task(_run_scans(loop, state))
+    elif state.next_scan is None:
+        ctx.logger.info("Variation scan already running. A follow-up scan will include this event.")
+    if state.next_scan is None:
+        state.next_scan = loop.create_future()
+    # The scan logs and emits through the most recent event's context
+    state.next_ctx = ctx
+    return await asyncio.shield(state.next_scan)
+
 if __name__ == "__main__":
     # Sample job description and current message for testing
     sample_job_description = """
@@ -184,21 +618,24 @@ if __name__ == "__main__":
     Alex
     """
 
-    async def test_generate_variation():
-        print("Testing generate_variation function...")
+    async def test_generate_variations():
+        print("Testing generate_variations function...")
         print("\nSample Current Message:")
         print(sample_current_message)
         print("\nSample Job Description:")
         print(sample_job_description)
 
-        print("\nGenerating variation...")
-        result = await generate_variation(
-            job_description=sample_job_description,
-            current_message=sample_current_message
-        )
+        print("\nGenerating variations...")
+        async with VariationSession() as session:
+            result = await generate_variations(
+                session,
+                job_description=sample_job_description,
+                current_message=sample_current_message
+            )
 
-        print("\nGenerated Variation:")
-        print(result)
+        print("\nGenerated Variations:")
+        for variation in result:
+            print(variation)
 
     # Run the test function
-    asyncio.run(test_generate_variation())
\ No newline at end of file
+    asyncio.run(test_generate_variations())
\ No newline at end of file
@@ -1,6 +1,8 @@
-from typing import Dict, List, Any
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import asyncio
 import logging
-import marvin
+import re
 from pydantic import BaseModel, Field
 
 # Setup logging
@@ -30,17 +32,20 @@ class JobQuery(BaseModel):
     )
 
 
-def parse_job_query(job_query: Dict[str, int]) -> JobQuery:
-    """
-    Parse the raw query string into structured job search parameters
+class _RoleLocation(BaseModel):
+    """Fields the LLM extracts from a query; the rest of JobQuery comes from the event"""
 
-    Args:
-        query: The job query object from the user (e.g., 'find founding engineer roles in san francisco')
+    role: str = Field(..., description="Job role/title to search for")
+    location: str = Field("remote", description="Location preference (default: remote)")
 
-    Returns:
-        JobQuery object with role and location extracted
-    """
-    instructions = """
+
+class _QueryRoleLocation(_RoleLocation):
+    """Batched extraction result, echoing the query it belongs to"""
+
+    query: str = Field(..., description="The query this result was extracted from, copied verbatim")
+
+
+EXTRACTION_INSTRUCTIONS = """
     Analyze the job search query and extract:
     1. The job role or title being searched for
     2. The location preference (if mentioned, otherwise use "remote")
@@ -51,74 +56,185 @@ def parse_job_query(job_query: Dict[str, int]) -> JobQuery:
     - location: san francisco
     """
 
-    parsed_query = marvin.extract(job_query, target=JobQuery, instructions=instructions)
-    logger.info(f"Parsed query: {parsed_query}")
-    parsed_query[0].query = job_query["query"]
-    parsed_query[0].limit = job_query["limit"]
 
-    return parsed_query[0]
+# Common query shape: "[find] <role> roles|jobs|positions [in <location>]"
+_FAST_QUERY_RE = re.compile(
+    r"^(?:find\s+)?(?!find\b)(?P<role>.+?)\s+(?:roles?|jobs?|positions?)(?:\s+in\s+(?P<location>.+?))?\s*$",
+    re.IGNORECASE,
+)
+
+
+def normalize_query(query: str) -> str:
+    """Collapse whitespace so equivalent queries share a cache entry, keeping the user's casing"""
+    return " ".join(query.split())
+
+
+def fast_parse_query(query_text: str) -> Optional[Tuple[str, str]]:
+    """Parse common query shapes into (role, location) without the LLM, or return None"""
+    match = _FAST_QUERY_RE.match(query_text)
+    if not match:
+        return None
+    return match.group("role"), match.group("location") or "remote"
+
+
+def _extract_role_location(query_text: str) -> Tuple[str, str]:
+    """Extract (role, location) from a normalized query with Marvin"""
+    # Imported lazily: most queries are answered without the LLM, and marvin is slow to import
+    import marvin
+
+    extracted = marvin.extract(query_text, target=_RoleLocation, instructions=EXTRACTION_INSTRUCTIONS)
+    logger.info("Parsed query: %s", extracted)
+    return extracted[0].role, extracted[0].location
 
 
-@marvin.fn
-def generate_google_dorks(parsed_query: JobQuery) -> List[str]:
+def _extract_role_locations(queries: List[str]) -> List[Tuple[str, str]]:
+    """Extract (role, location) for several normalized queries with a single Marvin call"""
+    if len(queries) == 1:
+        return [_extract_role_location(queries[0])]
+
+    import marvin
+
+    extracted = marvin.cast(
+        queries,
+        target=List[_QueryRoleLocation],
+        instructions=EXTRACTION_INSTRUCTIONS + "\n    Return one result per query, with the query copied verbatim.",
+    )
+    # Results are matched on the echoed query, never by position, so a reordered or
+    # rewritten answer cannot be cached for the wrong query
+    results = {normalize_query(item.query): (item.role, item.location) for item in extracted}
+    missing = [query_text for query_text in queries if query_text not in results]
+    if missing:
+        logger.warning("Batched extraction did not answer %d of %d queries", len(missing), len(queries))
+        for query_text in missing:
+            results[query_text] = _extract_role_location(query_text)
+    logger.info("Parsed %d queries in one batch", len(queries))
+    return [results[query_text] for query_text in queries]
+
+
+# Memoized (role, location) per normalized query, least recently used first
+ROLE_LOCATION_CACHE_SIZE = 1024
+_role_location_cache: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()
+
+# Queries that need the LLM are batched: up to BATCH_SIZE queries arriving within
+# BATCH_WINDOW seconds share one Marvin call
+BATCH_SIZE = 8
+BATCH_WINDOW = 0.05
+_extraction_queue = None
+_extraction_queue_loop = None
+
+
+def _cache_role_location(query_text: str, role_location: Tuple[str, str]) -> None:
+    _role_location_cache[query_text] = role_location
+    _role_location_cache.move_to_end(query_text)
+    if len(_role_location_cache) > ROLE_LOCATION_CACHE_SIZE:
+        _role_location_cache.popitem(last=False)
+
+
+async def _extraction_batch_worker(queue: asyncio.Queue) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await queue.get()]
+        deadline = loop.time() + BATCH_WINDOW
+        while len(batch) < BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        queries = list(dict.fromkeys(query_text for query_text, _ in batch))
+        try:
+            # marvin is a blocking LLM client, so run it off the event loop
+            results = dict(zip(queries, await asyncio.to_thread(_extract_role_locations, queries)))
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            continue
+
+        for query_text, role_location in results.items():
+            _cache_role_location(query_text, role_location)
+        for query_text, future in batch:
+            if not future.done():
+                future.set_result(results[query_text])
+
+
+async def _extract_role_location_batched(query_text: str) -> Tuple[str, str]:
+    global _extraction_queue, _extraction_queue_loop
+    loop = asyncio.get_running_loop()
+    if _extraction_queue is None or _extraction_queue_loop is not loop:
+        _extraction_queue = asyncio.Queue()
+        _extraction_queue_loop = loop
+        loop.create_task(_extraction_batch_worker(_extraction_queue))
+
+    future = loop.create_future()
+    await _extraction_queue.put((query_text, future))
+    return await future
+
+
+async def parse_job_query(job_query: Dict[str, int]) -> JobQuery:
     """
-    Generate 3–5 high-quality Google search queries (dorks) to find job listings on workatastartup.com.
-
-    The goal is to discover live job posts for a specific role and location.
-
-    Instructions:
-    - Use: site:workatastartup.com as the base
-    - Include the exact job role in quotes, e.g. "founding engineer"
-    - If location is not "remote", include it in quotes too, e.g. "San Francisco"
-    - Include natural terms like: "jobs", "we're hiring", "open roles"
-    - Avoid generic keywords that return company pages
-    - Output only clean, complete Google-ready queries as a list of strings
-
-    Input:
-    - Role: founding engineer
-    - Location: San Francisco
-
-    Output:
-    [
-      'site:workatastartup.com "founding engineer" "San Francisco"',
-      'site:workatastartup.com "founding engineer" "San Francisco" "jobs"',
-      'site:workatastartup.com "founding engineer" "we're hiring" "San Francisco"',
-      'site:workatastartup.com "founding engineer" "San Francisco" "open role"',
-      'site:workatastartup.com "founding engineer" "job listing" "San Francisco"'
-    ]
+    Parse the raw query string into structured job search parameters
+
+    Args:
+        query: The job query object from the user (e.g., 'find founding engineer roles in san francisco')
+
+    Returns:
+        JobQuery object with role and location extracted
     """
+    query_text = normalize_query(job_query["query"])
+
+    # Parse common query shapes directly and only fall back to the LLM otherwise
+    parsed = fast_parse_query(query_text)
+    if parsed:
+        role, location = parsed
+    elif query_text in _role_location_cache:
+        _role_location_cache.move_to_end(query_text)
+        role, location = _role_location_cache[query_text]
+    else:
+        role, location = await _extract_role_location_batched(query_text)
+    return JobQuery(
+        query=job_query["query"],
+        role=role,
+        location=location,
+        limit=job_query["limit"],
+    )
+
+
+# Google dork templates, most specific first
+DORK_BASE = "site:workatastartup.com"
+_DORK_TEMPLATES = (
+    "{base} {role} {location}",
+    "{base} {role} {location} jobs",
+    "{base} {role} hiring",
+)
+_DORK_TEMPLATES_NO_LOCATION = (
+    "{base} {role}",
+    "{base} {role} jobs",
+    "{base} {role} hiring",
+)
+
 
 def generate_smart_dorks(parsed_query: JobQuery) -> List[str]:
     """Generate optimized Google dorks for job searching"""
-    # Convert dict to object if needed
-    base = "site:workatastartup.com"
-    dorks = []
-
     # Format role with quotes if it contains spaces
-    role = f'"{parsed_query.role}"' if ' ' in parsed_query.role else parsed_query.role
+    role = f'"{r}"' if ' ' in (r := parsed_query.role) else r
 
     # Format location with quotes
-    location = ""
-    if parsed_query.location:
-        if parsed_query.location.lower() == "remote":
-            location = '"remote"'
-        else:
-            location = f'"{parsed_query.location}"'
-
-    # Core dorks (most specific first)
+    location = parsed_query.location
     if location:
-        dorks.append(f"{base} {role} {location}")
-        dorks.append(f"{base} {role} {location} jobs")
-    else:
-        dorks.append(f"{base} {role}")
-        dorks.append(f"{base} {role} jobs")
+        location = '"remote"' if location.lower() == "remote" else f'"{location}"'
 
-    # Add one variation with "hiring" only if we have few dorks
-    if len(dorks) < 3:
-        dorks.append(f"{base} {role} hiring")
+    templates = _DORK_TEMPLATES if location else _DORK_TEMPLATES_NO_LOCATION
+    # Drop any duplicate dorks so the same search never runs twice
+    dorks = list(dict.fromkeys(
+        t.format(base=DORK_BASE, role=role, location=location) for t in templates
+    ))
 
-    logger.info(f"Generated {len(dorks)} Google dorks for {parsed_query.role}")
-    return dorks[:parsed_query.limit if hasattr(parsed_query, 'limit') else 3]
+    logger.info("Generated %d Google dorks for %s", len(dorks), parsed_query.role)
+    return dorks[:parsed_query.limit]
 
 
 async def handler(args, ctx):
@@ -135,12 +251,12 @@ async def handler(args, ctx):
     ctx.logger.info(f"Received event: {args}")
 
     # Extract raw query from the event
-    if hasattr(args, "query"):
+    try:
         query = args.query
-        limit = getattr(args, "limit", 10)
-    else:
+    except AttributeError as e:
         ctx.logger.error(f"Invalid event format: {args}")
-        raise ValueError("Expected event with 'raw_query' field")
+        raise ValueError("Expected event with 'query' field") from e
+    limit = getattr(args, "limit", 10)
 
     try:
         raw_query = {
@@ -148,7 +264,7 @@ async def handler(args, ctx):
             "limit": limit,
         }
 
-        parsed_query = parse_job_query(raw_query)
+        parsed_query = await parse_job_query(raw_query)
         ctx.logger.info(
             f"Extracted role: '{parsed_query.role}', location: '{parsed_query.location}'"
         )
@@ -162,17 +278,16 @@ async def handler(args, ctx):
         }
         parsed_query = JobQuery(**parsed_data)
 
-    # Generate Google dorks using Marvin
+    # Generate Google dorks
     try:
-        # google_dorks = generate_google_dorks(parsed_query=parsed_query)
         google_dorks = generate_smart_dorks(parsed_query=parsed_query)
         parsed_query.google_dorks = google_dorks
-        ctx.logger.info(f"Generated {len(google_dorks)} Google dorks using Marvin")
+        ctx.logger.info(f"Generated {len(google_dorks)} Google dorks")
     except Exception as e:
-        ctx.logger.error(f"Error generating dorks with Marvin: {str(e)}")
+        ctx.logger.error(f"Error generating dorks: {str(e)}")
 
-    # Emit the processed result
-    await ctx.emit({"topic": "job.query.processed", "data": parsed_query.dict()})
+    # Emit the processed result and return it as a dictionary
+    result = parsed_query.model_dump(mode="json")
+    await ctx.emit({"topic": "job.query.processed", "data": result})
 
-    # Return the result as a dictionary
-    return parsed_query.dict()
+    return result
@@ -0,0 +1,39 @@
+import asyncio
+import importlib.util
+import types
+from pathlib import Path
+
+STEP_PATH = Path(__file__).resolve().parent.parent / "steps" / "generate-variations.step.py"
+
+spec = importlib.util.spec_from_file_location("generate_variations_step", STEP_PATH)
+generate_variations = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(generate_variations)
+
+
+def _ctx():
+    logger = types.SimpleNamespace(info=lambda *a: None, warn=lambda *a: None, error=lambda *a: None)
+    return types.SimpleNamespace(logger=logger)
+
+
+def test_overlapping_events_run_at_most_two_scans(monkeypatch):
+    scans = []
+
+    async def scan(ctx):
+        scans.append(ctx)
+        await asyncio.sleep(0.05)
+        return {"success": True, "count": len(scans)}
+
+    monkeypatch.setattr(generate_variations, "generate_all_variations", scan)
+
+    async def run():
+        first = asyncio.ensure_future(generate_variations.handler({}, _ctx()))
+        await asyncio.sleep(0.01)
+        overlapping = [generate_variations.handler({}, _ctx()) for _ in range(5)]
+        return await first, await asyncio.gather(*overlapping)
+
+    first, overlapping = asyncio.run(run())
+
+    assert len(scans) == 2
+    assert first["count"] == 1
+    assert all(result["count"] == 2 for result in overlapping)
+    assert not generate_variations._scan_states
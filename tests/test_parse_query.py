@@ -0,0 +1,94 @@
+import asyncio
+import importlib.util
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+STEP_PATH = Path(__file__).resolve().parent.parent / "steps" / "parse-query.step.py"
+
+spec = importlib.util.spec_from_file_location("parse_query_step", STEP_PATH)
+parse_query = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(parse_query)
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("find founding engineer roles in san francisco", ("founding engineer", "san francisco")),
+        ("Find ML Engineer jobs in NYC", ("ML Engineer", "NYC")),
+        ("backend  engineer jobs", ("backend engineer", "remote")),
+        ("Staff Engineer positions in New York", ("Staff Engineer", "New York")),
+        ("find jobs in sf", None),
+        ("find roles in London", None),
+        ("senior engineer at stripe", None),
+    ],
+)
+def test_fast_parse_query(query, expected):
+    assert parse_query.fast_parse_query(parse_query.normalize_query(query)) == expected
+
+
+@pytest.fixture
+def extractor(monkeypatch):
+    """Replace the Marvin batch extraction with a recording fake"""
+    calls = []
+
+    def extract(queries):
+        calls.append(list(queries))
+        if extract.error:
+            raise extract.error
+        return [(f"role of {query_text}", "remote") for query_text in queries]
+
+    extract.error = None
+    extract.calls = calls
+    monkeypatch.setattr(parse_query, "_extract_role_locations", extract)
+    monkeypatch.setattr(parse_query, "_role_location_cache", parse_query.OrderedDict())
+    return extract
+
+
+def test_concurrent_misses_share_one_extraction(extractor):
+    queries = ["senior engineer at stripe", "designer for startups", "senior engineer at stripe"]
+
+    async def run():
+        return await asyncio.gather(*(parse_query._extract_role_location_batched(q) for q in queries))
+
+    results = asyncio.run(run())
+
+    assert extractor.calls == [["senior engineer at stripe", "designer for startups"]]
+    assert results == [(f"role of {q}", "remote") for q in queries]
+
+
+def test_extraction_error_reaches_every_waiter(extractor):
+    extractor.error = RuntimeError("LLM unavailable")
+    queries = ["senior engineer at stripe", "designer for startups"]
+
+    async def run():
+        return await asyncio.gather(
+            *(parse_query._extract_role_location_batched(q) for q in queries),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(run())
+
+    assert len(extractor.calls) == 1
+    assert results == [extractor.error, extractor.error]
+    assert not parse_query._role_location_cache
+
+
+def test_batched_results_are_matched_by_query(monkeypatch):
+    queries = ["senior engineer at stripe", "designer for startups"]
+
+    def cast(data, target, instructions):
+        # Answers come back out of order
+        return [
+            parse_query._QueryRoleLocation(query="designer for startups", role="designer"),
+            parse_query._QueryRoleLocation(query="senior engineer at stripe", role="senior engineer", location="stripe"),
+        ]
+
+    monkeypatch.setitem(sys.modules, "marvin", types.SimpleNamespace(cast=cast))
+
+    assert parse_query._extract_role_locations(queries) == [
+        ("senior engineer", "stripe"),
+        ("designer", "remote"),
+    ]